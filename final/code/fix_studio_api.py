@@ -8,6 +8,7 @@ from audio_processor import AudioProcessor
 import os
 import sqlite3
 import time
+from auth import create_user, authenticate
 
 app = Flask(__name__)
 
@@ -280,14 +281,7 @@ def signup():
             return jsonify({"error": "Password must be at least 6 characters"}), 400
 
         try:
-            conn = sqlite3.connect(USERS_DB_PATH)
-            c = conn.cursor()
-            c.execute(
-                "INSERT INTO users (fullName, username, email, password) VALUES (?, ?, ?, ?)",
-                (fullName, username, email, password)
-            )
-            conn.commit()
-            conn.close()
+            create_user(USERS_DB_PATH, fullName, username, email, password)
             print(f"User registered: {username}")
             return jsonify({"message": "Signup successful"}), 201
 
@@ -318,25 +312,13 @@ def signin():
         if not username or not password:
             return jsonify({"error": "Username and password are required"}), 400
 
-        conn = sqlite3.connect(USERS_DB_PATH)
-        c = conn.cursor()
-        c.execute(
-            "SELECT id, fullName, username, email FROM users WHERE username = ? AND password = ?",
-            (username, password)
-        )
-        user = c.fetchone()
-        conn.close()
+        user = authenticate(USERS_DB_PATH, username, password)
 
         if user:
             print(f"User signed in: {username}")
             return jsonify({
                 "message": "Signin successful",
-                "user": {
-                    "id": user[0],
-                    "fullName": user[1],
-                    "username": user[2],
-                    "email": user[3]
-                }
+                "user": user
             }), 200
         else:
             return jsonify({"error": "Invalid username or password"}), 401
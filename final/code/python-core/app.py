@@ -4,7 +4,7 @@ import random
 from music_generator import query_musicgen
 from mood_analyzer import MoodAnalyzer
 from audio_processor import AudioProcessor
-from pydub import AudioSegment
+from pcm_io import read_wav_file
 import matplotlib.pyplot as plt
 import seaborn as sns
 
@@ -89,8 +89,7 @@ if st.button("🎶 Generate Music"):
                 mime="audio/mp3"
             )
 
-            audio_segment = AudioSegment.from_file(audio_file)
-            samples = np.array(audio_segment.get_array_of_samples())
+            samples, _ = read_wav_file(result["wav_file"])
 
             plt.figure(figsize=(12, 2))
             sns.set_style("darkgrid")
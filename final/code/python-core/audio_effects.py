@@ -0,0 +1,276 @@
+import numpy as np
+from config import Config
+
+
+def _apply_gain(block, gain):
+    if block.ndim == 2 and np.ndim(gain) == 1:
+        gain = gain[:, None]
+    np.multiply(block, gain, out=block)
+
+
+def db_to_gain(db):
+    return np.float32(10.0 ** (db / 20.0))
+
+
+def integrated_loudness(samples, sr):
+    """
+    Gated integrated loudness in LUFS (BS.1770 gating: 400 ms blocks, 75 %
+    overlap, -70 LUFS absolute and -10 LU relative gates). K-weighting is
+    omitted, so this is an approximation that tracks perceived loudness
+    closely enough for normalizing generated music.
+    """
+    mono = samples.mean(axis=1) if samples.ndim == 2 else samples
+    step = int(sr * 0.1)
+    count = len(mono) // step
+    if count < 4:
+        power = float(np.mean(np.square(mono, dtype=np.float64))) if len(mono) else 0.0
+        return -0.691 + 10 * np.log10(power + 1e-12)
+
+    # Mean square per 100 ms, then 400 ms windows with 100 ms hop
+    sub = np.square(mono[:count * step].reshape(count, step), dtype=np.float64).mean(axis=1)
+    power = np.convolve(sub, np.full(4, 0.25), mode="valid")
+    loudness = -0.691 + 10 * np.log10(power + 1e-12)
+
+    gated = power[loudness > -70]
+    if len(gated) == 0:
+        return -70.0
+    relative = -0.691 + 10 * np.log10(gated.mean()) - 10
+    gated = power[(loudness > -70) & (loudness > relative)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+class Gain:
+    def __init__(self, db):
+        self.gain = db_to_gain(db)
+
+    def process(self, block):
+        block *= self.gain
+
+
+class Fade:
+    """Linear fade in/out over a stream of known total length."""
+
+    def __init__(self, sr, total_frames, fade_in=0.0, fade_out=0.0):
+        self.total = total_frames
+        self.fade_in = max(1, int(fade_in * sr)) if fade_in else 0
+        self.fade_out = max(1, int(fade_out * sr)) if fade_out else 0
+        self.pos = 0
+
+    def process(self, block):
+        start, end = self.pos, self.pos + len(block)
+        self.pos = end
+        in_fade = start < self.fade_in
+        out_fade = end > self.total - self.fade_out
+        if not (in_fade or out_fade):
+            return
+        idx = np.arange(start, end, dtype=np.float32)
+        gain = np.ones(len(block), dtype=np.float32)
+        if in_fade:
+            np.minimum(gain, idx / self.fade_in, out=gain)
+        if out_fade:
+            np.minimum(gain, (self.total - idx) / self.fade_out, out=gain)
+        np.clip(gain, 0.0, 1.0, out=gain)
+        _apply_gain(block, gain)
+
+
+class Compressor:
+    """
+    Feed-forward peak compressor. Gain is computed per `chunk` samples and
+    smoothed with attack/release across chunks, so the Python-level loop
+    runs len(block) / chunk times rather than once per sample.
+    """
+
+    def __init__(self, sr, threshold_db=-18.0, ratio=4.0, attack_ms=5.0,
+                 release_ms=120.0, makeup_db=0.0, chunk=64):
+        self.threshold = threshold_db
+        self.slope = 1.0 - 1.0 / ratio
+        self.chunk = chunk
+        chunk_seconds = chunk / sr
+        self.attack = np.exp(-chunk_seconds / max(attack_ms / 1000.0, 1e-6))
+        self.release = np.exp(-chunk_seconds / max(release_ms / 1000.0, 1e-6))
+        self.makeup = makeup_db
+        self.reduction = 0.0
+
+    def process(self, block):
+        frames = len(block)
+        count = -(-frames // self.chunk)
+        mono = np.abs(block).max(axis=1) if block.ndim == 2 else np.abs(block)
+        padded = np.zeros(count * self.chunk, dtype=np.float32)
+        padded[:frames] = mono
+        peaks_db = 20 * np.log10(padded.reshape(count, self.chunk).max(axis=1) + 1e-9)
+        targets = np.maximum(0.0, peaks_db - self.threshold) * self.slope
+
+        smoothed = np.empty(count, dtype=np.float32)
+        reduction = self.reduction
+        for i, target in enumerate(targets):
+            coeff = self.attack if target > reduction else self.release
+            reduction = coeff * reduction + (1 - coeff) * target
+            smoothed[i] = reduction
+        self.reduction = reduction
+
+        gain = db_to_gain(self.makeup - smoothed)
+        _apply_gain(block, np.repeat(gain, self.chunk)[:frames])
+
+
+class Limiter(Compressor):
+    """Fast, infinite-ratio compressor followed by a hard ceiling."""
+
+    def __init__(self, sr, ceiling_db=-1.0):
+        super().__init__(sr, threshold_db=ceiling_db, ratio=np.inf,
+                         attack_ms=0.5, release_ms=60.0, chunk=32)
+        self.ceiling = db_to_gain(ceiling_db)
+
+    def process(self, block):
+        super().process(block)
+        np.clip(block, -self.ceiling, self.ceiling, out=block)
+
+
+class _FeedbackDelay:
+    """
+    Comb (y[n] = x[n] + g*y[n-D]) or Schroeder allpass
+    (y[n] = -g*x[n] + x[n-D] + g*y[n-D]) filter. Each step only looks D
+    samples back, so it is evaluated in vectorized chunks of up to D.
+    """
+
+    def __init__(self, delay, feedback, allpass=False):
+        self.delay = delay
+        self.g = np.float32(feedback)
+        self.allpass = allpass
+        self.x_hist = np.zeros(delay, dtype=np.float32)
+        self.y_hist = np.zeros(delay, dtype=np.float32)
+
+    def process(self, x):
+        d = self.delay
+        x_ext = np.concatenate((self.x_hist, x))
+        y_ext = np.concatenate((self.y_hist, np.empty(len(x), dtype=np.float32)))
+        for start in range(d, len(y_ext), d):
+            end = min(start + d, len(y_ext))
+            n = end - start
+            out = y_ext[start:end]
+            np.multiply(y_ext[start - d:start - d + n], self.g, out=out)
+            if self.allpass:
+                out += x_ext[start - d:start - d + n]
+                out -= self.g * x_ext[start:end]
+            else:
+                out += x_ext[start:end]
+        self.x_hist = x_ext[-d:].copy()
+        self.y_hist = y_ext[-d:].copy()
+        return y_ext[d:]
+
+
+class Reverb:
+    """Schroeder reverb: four parallel combs into two series allpasses."""
+
+    COMB_DELAYS = (1557, 1617, 1491, 1422)
+    ALLPASS_DELAYS = (225, 556)
+
+    def __init__(self, sr, mix=0.2, room=0.8):
+        scale = sr / 44100.0
+        self.mix = np.float32(mix)
+        self.combs = [_FeedbackDelay(int(d * scale), room * 0.98) for d in self.COMB_DELAYS]
+        self.allpasses = [_FeedbackDelay(int(d * scale), 0.5, allpass=True)
+                          for d in self.ALLPASS_DELAYS]
+
+    def process(self, block):
+        dry = block.mean(axis=1) if block.ndim == 2 else block
+        wet = np.zeros(len(block), dtype=np.float32)
+        for comb in self.combs:
+            wet += comb.process(dry)
+        for allpass in self.allpasses:
+            wet = allpass.process(wet)
+        wet *= self.mix / len(self.combs)
+        block *= 1 - self.mix
+        if block.ndim == 2:
+            block += wet[:, None]
+        else:
+            block += wet
+
+
+class EffectsChain:
+    """Runs processors over float32 blocks in place, in a single pass."""
+
+    def __init__(self, processors, block_size=None):
+        self.processors = processors
+        self.block_size = block_size or Config.DSP_BLOCK_SIZE
+
+    def process_block(self, block):
+        for processor in self.processors:
+            processor.process(block)
+        return block
+
+    def run(self, samples):
+        for start in range(0, len(samples), self.block_size):
+            self.process_block(samples[start:start + self.block_size])
+        return samples
+
+
+# Accepted range per numeric effects option; values outside are clamped
+EFFECT_LIMITS = {
+    "target_lufs": (-40.0, -6.0),
+    "reverb": (0.0, 1.0),
+    "fade_in": (0.0, 10.0),
+    "fade_out": (0.0, 10.0),
+}
+
+
+def parse_effects(options):
+    """
+    Validate request effects options; returns (effects, None) or (None, error
+    message). Numbers are clamped to EFFECT_LIMITS and unknown keys dropped,
+    so equivalent requests share one render cache key.
+    """
+    if options is None:
+        return None, None
+    if not isinstance(options, dict):
+        return None, "effects must be an object"
+    effects = {}
+    for name, (low, high) in EFFECT_LIMITS.items():
+        value = options.get(name)
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            return None, f"effects.{name} must be a number"
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None, f"effects.{name} must be a number"
+        if not np.isfinite(value):
+            return None, f"effects.{name} must be a number"
+        effects[name] = min(max(value, low), high)
+    if options.get("compress") is not None:
+        if not isinstance(options["compress"], bool):
+            return None, "effects.compress must be true or false"
+        effects["compress"] = options["compress"]
+    return effects or None, None
+
+
+def build_chain(sr, samples, options, total_frames=None):
+    """
+    Build the post-processing chain for `samples` from request options:
+    target_lufs, reverb (wet mix), compress (bool), fade_in / fade_out
+    (seconds), as validated by parse_effects(). Loudness is measured once
+    on `samples` and corrected first, so the compressor threshold can sit
+    just above the target level. A limiter always runs to keep peaks under
+    0 dBFS. For a streamed track, `samples` is a representative excerpt and
+    `total_frames` the full length the fades are laid out over.
+    """
+    processors = []
+    threshold_db = -18.0
+    if options.get("target_lufs") is not None:
+        target = float(options["target_lufs"])
+        processors.append(Gain(target - integrated_loudness(samples, sr)))
+        threshold_db = target + 4.0
+    if options.get("reverb"):
+        processors.append(Reverb(sr, mix=float(options["reverb"])))
+    if options.get("compress"):
+        processors.append(Compressor(sr, threshold_db=threshold_db, ratio=3.0))
+    processors.append(Limiter(sr))
+    if options.get("fade_in") or options.get("fade_out"):
+        processors.append(Fade(
+            sr,
+            total_frames or len(samples),
+            fade_in=float(options.get("fade_in", 0)),
+            fade_out=float(options.get("fade_out", 0)),
+        ))
+    return EffectsChain(processors)
+
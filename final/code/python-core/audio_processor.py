@@ -1,7 +1,6 @@
 import os
-import io
 import tempfile
-from pydub import AudioSegment
+from pcm_io import load_audio, write_wav, encode_file
 
 class AudioProcessor:
     def __init__(self):
@@ -10,31 +9,31 @@ class AudioProcessor:
     def process_audio_bytes(self, audio_bytes, params=None, output_format="mp3"):
         """
         Accept audio bytes (MP3/WAV/etc.), convert internally, return MP3/WAV.
+        WAV input is read in place; ffmpeg only runs for compressed codecs.
         """
         params = params or {}
         duration = params.get("duration", 10)
         filename = f"music_{int(duration)}s"
 
-        # Load bytes into AudioSegment (auto-detect format)
-        audio = AudioSegment.from_file(io.BytesIO(audio_bytes))
+        # Zero-copy view for PCM WAV, ffmpeg decode otherwise
+        samples, sr = load_audio(audio_bytes)
 
         # Optional: ensure minimum duration
-        if len(audio) < duration * 1000:
-            silence = AudioSegment.silent(duration=(duration*1000 - len(audio)))
-            audio += silence
+        pad_frames = max(0, int(duration * sr) - len(samples))
 
         # Save WAV first
         wav_path = os.path.join(self.temp_dir, filename + ".wav")
-        audio.export(wav_path, format="wav")
+        write_wav(wav_path, samples, sr, pad_frames=pad_frames)
 
         # Convert to MP3 if requested
         final_path = wav_path
         if output_format.lower() in ["mp3", "mp3file"]:
             final_path = os.path.join(self.temp_dir, filename + ".mp3")
-            audio.export(final_path, format="mp3", bitrate="192k")
+            encode_file(wav_path, final_path, bitrate="192k")
 
         return {
             "audio_file": final_path,
+            "wav_file": wav_path,
             "processing_successful": True,
             "file_size_mb": round(os.path.getsize(final_path) / (1024*1024), 3)
         }
@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import hmac
+import json
+import base64
+import hashlib
+import secrets
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+HASH_SCHEME = "scrypt"
+
+_hash_pool = ThreadPoolExecutor(
+    max_workers=Config.AUTH_HASH_WORKERS,
+    thread_name_prefix="auth-hash"
+)
+_local = threading.local()
+if Config.REQUIRE_AUTH and not Config.SECRET_KEY:
+    # A per-process key would invalidate every token each time a worker restarts
+    raise RuntimeError("REQUIRE_AUTH=1 needs AUTH_SECRET_KEY set to a stable secret")
+# Without a configured key tokens are only valid for this process' lifetime
+_secret_key = (Config.SECRET_KEY or secrets.token_hex(32)).encode("utf-8")
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode("ascii")
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode("utf-8"),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        maxmem=256 * n * r,
+        dklen=32
+    )
+
+
+def hash_password(password: str, n=None, r=None, p=None) -> str:
+    n = n or Config.SCRYPT_N
+    r = r or Config.SCRYPT_R
+    p = p or Config.SCRYPT_P
+    salt = os.urandom(16)
+    digest = _scrypt(password, salt, n, r, p)
+    return f"{HASH_SCHEME}${n}${r}${p}${_b64(salt)}${_b64(digest)}"
+
+
+def is_hashed(stored: str) -> bool:
+    return stored.startswith(HASH_SCHEME + "$")
+
+
+def verify_password(password: str, stored: str) -> bool:
+    if not is_hashed(stored):
+        # Legacy plaintext row; migrated by authenticate() on success
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+    try:
+        _, n, r, p, salt, digest = stored.split("$")
+        expected = base64.b64decode(digest)
+        actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored: str) -> bool:
+    if not is_hashed(stored):
+        return True
+    params = stored.split("$")[1:4]
+    return params != [str(Config.SCRYPT_N), str(Config.SCRYPT_R), str(Config.SCRYPT_P)]
+
+
+# Verified against for unknown usernames; same cost parameters as real rows
+_DUMMY_HASH = hash_password(secrets.token_hex(16))
+
+
+def get_conn(db_path: str) -> sqlite3.Connection:
+    """Per-thread cached connection, so signin does not reopen the DB."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = conns[db_path] = sqlite3.connect(db_path)
+    return conn
+
+
+def create_user(db_path, full_name, username, email, password):
+    password_hash = _hash_pool.submit(hash_password, password).result()
+    conn = get_conn(db_path)
+    with conn:
+        conn.execute(
+            "INSERT INTO users (fullName, username, email, password) VALUES (?, ?, ?, ?)",
+            (full_name, username, email, password_hash)
+        )
+
+
+def authenticate(db_path, username, password):
+    """
+    Return the user dict for valid credentials, else None.
+    Plaintext or outdated-cost rows are rehashed on successful signin.
+    """
+    conn = get_conn(db_path)
+    row = conn.execute(
+        "SELECT id, fullName, username, email, password FROM users WHERE username = ?",
+        (username,)
+    ).fetchone()
+    if row is None:
+        # Same scrypt work as a real check, so response time does not reveal
+        # whether the username exists
+        _hash_pool.submit(verify_password, password, _DUMMY_HASH).result()
+        return None
+
+    stored = row[4]
+    if not _hash_pool.submit(verify_password, password, stored).result():
+        return None
+
+    if needs_rehash(stored):
+        new_hash = _hash_pool.submit(hash_password, password).result()
+        with conn:
+            conn.execute("UPDATE users SET password = ? WHERE id = ?", (new_hash, row[0]))
+
+    return {
+        "id": row[0],
+        "fullName": row[1],
+        "username": row[2],
+        "email": row[3]
+    }
+
+
+def _b64url(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64url_decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64url(hmac.new(_secret_key, payload.encode("ascii"), hashlib.sha256).digest())
+
+
+def issue_token(user: dict, ttl=None) -> str:
+    """Stateless token: base64url(JSON user + expiry) '.' HMAC-SHA256 signature."""
+    claims = dict(user, exp=int(time.time()) + (ttl or Config.TOKEN_TTL_SECONDS))
+    payload = _b64url(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+
+def decode_token(token: str):
+    """Return the claims (user fields plus 'exp') of a valid, unexpired token, else None."""
+    if not token.isascii():
+        # Valid tokens are base64url; anything else cannot be signed or compared
+        return None
+    payload, _, signature = token.partition(".")
+    if not signature or not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        claims = json.loads(_b64url_decode(payload))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict) or claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+class SessionCache:
+    """Issues signed tokens and caches verified ones for a short TTL."""
+
+    def __init__(self, ttl=None, maxsize=None):
+        self.ttl = ttl or Config.SESSION_TTL_SECONDS
+        self.maxsize = maxsize or Config.SESSION_CACHE_SIZE
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def issue(self, user: dict) -> str:
+        return issue_token(user)
+
+    def get(self, token: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._items.get(token)
+            if entry is not None and entry[0] >= now:
+                return entry[1]
+
+        claims = decode_token(token)
+        with self._lock:
+            if claims is None:
+                self._items.pop(token, None)
+                return None
+            remaining = claims.pop("exp") - time.time()
+            user = claims
+            if len(self._items) >= self.maxsize:
+                self._evict_expired()
+            if len(self._items) >= self.maxsize:
+                self._items.pop(next(iter(self._items)))
+            self._items[token] = (now + min(self.ttl, remaining), user)
+        return user
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for token in [t for t, (exp, _) in self._items.items() if exp < now]:
+            del self._items[token]
+
+
+def benchmark_cost(budget_ms=None, samples=20):
+    """
+    Time scrypt at increasing N and return the largest N whose p99
+    stays inside the signin budget, plus the per-N measurements.
+    """
+    budget_ms = budget_ms or Config.SIGNIN_P99_BUDGET_MS
+    results = []
+    best = None
+    for log_n in range(12, 19):
+        n = 2 ** log_n
+        stored = hash_password("benchmark-password", n=n)
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            verify_password("benchmark-password", stored)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        results.append((n, p99))
+        if p99 > budget_ms:
+            break
+        best = n
+    return best, results
+
+
+if __name__ == "__main__" and "--benchmark" in sys.argv:
+    best, results = benchmark_cost()
+    for n, p99 in results:
+        print(f"N=2**{n.bit_length() - 1}: p99 {p99:.1f} ms")
+    print(f"Recommended SCRYPT_N = {best} (budget {Config.SIGNIN_P99_BUDGET_MS} ms)")
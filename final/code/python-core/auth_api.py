@@ -1,11 +1,13 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import sqlite3
+from auth import create_user, authenticate, SessionCache
 
 app = Flask(__name__)
 CORS(app)  # ✅ allows React frontend to talk to backend
 
 DB_FILE = "users.db"
+sessions = SessionCache()
 
 # --- Initialize DB ---
 def init_db():
@@ -39,12 +41,7 @@ def signup():
         return jsonify({"error": "All fields are mandatory"}), 400
 
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("INSERT INTO users (fullName, username, email, password) VALUES (?, ?, ?, ?)",
-                  (fullName, username, email, password))
-        conn.commit()
-        conn.close()
+        create_user(DB_FILE, fullName, username, email, password)
         return jsonify({"message": "Signup successful"}), 200
     except sqlite3.IntegrityError:
         return jsonify({"error": "Username or email already exists"}), 400
@@ -60,20 +57,14 @@ def signin():
     if not username or not password:
         return jsonify({"error": "All fields are mandatory"}), 400
 
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT id, fullName, username, email FROM users WHERE username = ? AND password = ?",
-              (username, password))
-    user = c.fetchone()
-    conn.close()
+    user = authenticate(DB_FILE, username, password)
 
     if user:
-        return jsonify({"message": "Signin successful", "user": {
-            "id": user[0],
-            "fullName": user[1],
-            "username": user[2],
-            "email": user[3]
-        }}), 200
+        return jsonify({
+            "message": "Signin successful",
+            "user": user,
+            "token": sessions.issue(user)
+        }), 200
     else:
         return jsonify({"error": "Invalid username or password"}), 400
 
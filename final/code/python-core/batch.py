@@ -0,0 +1,72 @@
+import io
+import zipfile
+from audio_effects import parse_effects
+from config import Config
+
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_spec(item, max_duration=None):
+    """Validate one batch item; returns (spec, None) or (None, error message)."""
+    if not isinstance(item, dict):
+        return None, "Each item must be an object"
+    try:
+        duration = int(item.get("duration", 12))
+        tempo = int(item.get("tempo", 120))
+    except (TypeError, ValueError):
+        return None, "duration and tempo must be integers"
+    max_duration = max_duration or Config.MAX_DURATION_SECONDS
+    if duration < 5 or duration > max_duration:
+        return None, f"Duration must be between 5–{max_duration} seconds"
+    effects, error = parse_effects(item.get("effects"))
+    if error:
+        return None, error
+    return {
+        "prompt": str(item.get("prompt", "Calm music")),
+        "duration": duration,
+        "tempo": tempo,
+        "instruments": item.get("instruments", "piano"),
+        "effects": effects,
+    }, None
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable sink that zipfile streams into."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries):
+    """
+    Yield a ZIP archive (stored, not deflated: WAV barely compresses) built
+    from (name, bytes-or-binary-file) pairs, without holding it in memory.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+        for name, source in entries:
+            with archive.open(name, "w") as dest:
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    dest.write(source)
+                else:
+                    while True:
+                        chunk = source.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        yield sink.drain()
+                    source.close()
+            yield sink.drain()
+    yield sink.drain()
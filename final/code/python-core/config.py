@@ -1,5 +1,71 @@
+import os
+
+
 class Config:
     SENTIMENT_MODEL = "cardiffnlp/twitter-roberta-base-sentiment-latest"
     EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
     MAX_LENGTH = 128
-    DEVICE = "cpu"  
+    EMBEDDING_DIM = 384
+    # "hf" for the models above, "stub" for the offline lexicon/hashing backends
+    MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "hf")
+    DEVICE = "cpu"
+
+    # Torch CPU threading; 0 intra-op threads = derive from affinity/cgroup quota.
+    # Compare settings with `python torch_runtime.py --benchmark`.
+    TORCH_INTRA_OP_THREADS = int(os.environ.get("TORCH_INTRA_OP_THREADS", "0"))
+    TORCH_INTER_OP_THREADS = int(os.environ.get("TORCH_INTER_OP_THREADS", "1"))
+    TORCH_CPU_AFFINITY = os.environ.get("TORCH_CPU_AFFINITY", "")
+    INFERENCE_WORKERS = 1
+
+    DSP_BLOCK_SIZE = 4096
+    WAV_MMAP_THRESHOLD = 8 * 1024 * 1024
+    MAX_DURATION_SECONDS = 30
+    LONG_FORM_MAX_SECONDS = 600
+
+    # Password hashing (scrypt). Tune with `python auth.py --benchmark`.
+    SCRYPT_N = 2 ** 14
+    SCRYPT_R = 8
+    SCRYPT_P = 1
+    SIGNIN_P99_BUDGET_MS = 150
+    AUTH_HASH_WORKERS = 2
+    SESSION_TTL_SECONDS = 300
+    SESSION_CACHE_SIZE = 10000
+
+    # Signed session tokens issued by /signin. Set AUTH_SECRET_KEY (shared by all
+    # workers) in production; REQUIRE_AUTH=1 refuses to start without it.
+    SECRET_KEY = os.environ.get("AUTH_SECRET_KEY", "")
+    TOKEN_TTL_SECONDS = 7 * 24 * 3600
+    REQUIRE_AUTH = os.environ.get("REQUIRE_AUTH", "0") == "1"
+
+    # Admission control for /studio-generate
+    USER_RATE_PER_MINUTE = 6
+    USER_RATE_BURST = 3
+    IP_RATE_PER_MINUTE = 20
+    IP_RATE_BURST = 6
+    # Reverse proxies in front of the app that append to X-Forwarded-For.
+    # 0 trusts no forwarded headers and keys the IP limit on the socket peer.
+    TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", "0"))
+    # 0 = one render per CPU from affinity/cgroup quota, as for torch threads
+    MAX_CONCURRENT_RENDERS = int(os.environ.get("MAX_CONCURRENT_RENDERS", "0"))
+    RENDER_QUEUE_BUDGET_SECONDS = 10
+    BATCH_MAX_ITEMS = 24
+
+    # Render cache and idle-time pre-rendering of popular specs
+    RENDER_CACHE_MAX_BYTES = 512 * 1024 * 1024
+    # Part of every render cache key; bump whenever synthesis or effects code
+    # changes its output, since cached renders are served as immutable
+    RENDER_VERSION = 1
+    # Renders are content-addressed by their inputs, so clients may keep them
+    RENDER_MAX_AGE_SECONDS = 365 * 24 * 3600
+    PRERENDER_ENABLED = os.environ.get("PRERENDER", "1") == "1"
+    PRERENDER_TOP_N = 50
+    PRERENDER_WINDOW_DAYS = 7
+    PRERENDER_INTERVAL_SECONDS = 30
+    PRERENDER_MAX_LOAD = 0.5
+
+    # Opt-in request profiling: sample at a rate, or send "X-Profile: <PROFILE_SECRET>".
+    # The header trigger and the /profiles endpoints are disabled without a secret.
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_SECRET = os.environ.get("PROFILE_SECRET", "")
+    PROFILE_INTERVAL_MS = 5
+    PROFILE_KEEP = 50
@@ -0,0 +1,200 @@
+import re
+
+# Rollup tables kept in step with music_history by record_history(), so
+# dashboards read a handful of rows instead of scanning the raw history.
+AGGREGATE_TABLES = """
+CREATE TABLE IF NOT EXISTS history_daily_moods (
+    day TEXT NOT NULL,
+    mood TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    total_duration INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, mood)
+);
+CREATE TABLE IF NOT EXISTS history_user_daily (
+    username TEXT NOT NULL,
+    day TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    total_duration INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, day)
+);
+CREATE TABLE IF NOT EXISTS history_user_stats (
+    username TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    total_duration INTEGER NOT NULL DEFAULT 0,
+    first_at TIMESTAMP,
+    last_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS history_user_moods (
+    username TEXT NOT NULL,
+    mood TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, mood)
+);
+CREATE TABLE IF NOT EXISTS history_instruments (
+    instrument TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_INSTRUMENT_SPLIT = re.compile(r"\s*(?:,|\+|/|&|\band\b)\s*")
+
+
+def split_instruments(instruments) -> list:
+    """'Synth + drums, piano' -> ['synth', 'drums', 'piano']"""
+    if isinstance(instruments, (list, tuple)):
+        instruments = ",".join(str(i) for i in instruments)
+    parts = _INSTRUMENT_SPLIT.split(str(instruments or "").lower())
+    return list(dict.fromkeys(p.strip() for p in parts if p.strip()))
+
+
+def _apply_aggregates(c, username, mood, instruments, duration, created_at):
+    c.execute(
+        """
+        INSERT INTO history_daily_moods (day, mood, count, total_duration)
+        VALUES (date(?), ?, 1, ?)
+        ON CONFLICT (day, mood) DO UPDATE SET
+            count = count + 1, total_duration = total_duration + excluded.total_duration
+        """,
+        (created_at, mood, duration),
+    )
+    c.execute(
+        """
+        INSERT INTO history_user_daily (username, day, count, total_duration)
+        VALUES (?, date(?), 1, ?)
+        ON CONFLICT (username, day) DO UPDATE SET
+            count = count + 1, total_duration = total_duration + excluded.total_duration
+        """,
+        (username, created_at, duration),
+    )
+    c.execute(
+        """
+        INSERT INTO history_user_stats (username, count, total_duration, first_at, last_at)
+        VALUES (?, 1, ?, ?, ?)
+        ON CONFLICT (username) DO UPDATE SET
+            count = count + 1,
+            total_duration = total_duration + excluded.total_duration,
+            first_at = min(first_at, excluded.first_at),
+            last_at = max(last_at, excluded.last_at)
+        """,
+        (username, duration, created_at, created_at),
+    )
+    c.execute(
+        """
+        INSERT INTO history_user_moods (username, mood, count) VALUES (?, ?, 1)
+        ON CONFLICT (username, mood) DO UPDATE SET count = count + 1
+        """,
+        (username, mood),
+    )
+    c.executemany(
+        """
+        INSERT INTO history_instruments (instrument, count) VALUES (?, 1)
+        ON CONFLICT (instrument) DO UPDATE SET count = count + 1
+        """,
+        [(instrument,) for instrument in split_instruments(instruments)],
+    )
+
+
+def init_analytics_tables(conn):
+    """Create the rollup tables; a fresh set is rebuilt from existing history once."""
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_user_stats'"
+    ).fetchone()
+    with conn:
+        conn.executescript(AGGREGATE_TABLES)
+    if not existed:
+        rebuild_aggregates(conn)
+
+
+def rebuild_aggregates(conn):
+    with conn:
+        c = conn.cursor()
+        for table in ("history_daily_moods", "history_user_daily", "history_user_stats",
+                      "history_user_moods", "history_instruments"):
+            c.execute(f"DELETE FROM {table}")
+        rows = conn.execute(
+            "SELECT username, mood, instruments, duration, created_at FROM music_history"
+        )
+        for username, mood, instruments, duration, created_at in rows:
+            _apply_aggregates(c, username or "guest", mood, instruments, duration or 0, created_at)
+
+
+def record_history(conn, rows):
+    """
+    Insert history rows and update every rollup in one transaction.
+    `rows` are dicts with username, prompt, mood, instruments, tempo,
+    duration, energy and prompt_hash. Returns the new row ids.
+    """
+    row_ids = []
+    with conn:
+        c = conn.cursor()
+        created_at = c.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+        for row in rows:
+            c.execute(
+                """
+                INSERT INTO music_history
+                (username, prompt, mood, instruments, tempo, duration, energy, prompt_hash,
+                 created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (row["username"], row["prompt"], row["mood"], row["instruments"], row["tempo"],
+                 row["duration"], row["energy"], row["prompt_hash"], created_at),
+            )
+            row_ids.append(c.lastrowid)
+            _apply_aggregates(c, row["username"], row["mood"], row["instruments"],
+                              row["duration"], created_at)
+    return row_ids
+
+
+def user_stats(conn, username):
+    row = conn.execute(
+        "SELECT count, total_duration, first_at, last_at FROM history_user_stats WHERE username = ?",
+        (username,),
+    ).fetchone()
+    if row is None:
+        return None
+    moods = conn.execute(
+        "SELECT mood, count FROM history_user_moods WHERE username = ? ORDER BY count DESC",
+        (username,),
+    ).fetchall()
+    return {
+        "username": username,
+        "total_tracks": row[0],
+        "total_duration": row[1],
+        "average_duration": round(row[1] / row[0], 2) if row[0] else 0,
+        "first_at": row[2],
+        "last_at": row[3],
+        "moods": dict(moods),
+        "favorite_mood": moods[0][0] if moods else None,
+    }
+
+
+def user_daily(conn, username, days=30):
+    rows = conn.execute(
+        """
+        SELECT day, count, total_duration FROM history_user_daily
+        WHERE username = ? AND day >= date('now', ?)
+        ORDER BY day
+        """,
+        (username, f"-{int(days)} days"),
+    ).fetchall()
+    return [{"day": d, "count": n, "total_duration": t} for d, n, t in rows]
+
+
+def daily_moods(conn, days=30):
+    rows = conn.execute(
+        """
+        SELECT day, mood, count, total_duration FROM history_daily_moods
+        WHERE day >= date('now', ?)
+        ORDER BY day, mood
+        """,
+        (f"-{int(days)} days",),
+    ).fetchall()
+    return [{"day": d, "mood": m, "count": n, "total_duration": t} for d, m, n, t in rows]
+
+
+def popular_instruments(conn, limit=10):
+    rows = conn.execute(
+        "SELECT instrument, count FROM history_instruments ORDER BY count DESC LIMIT ?",
+        (int(limit),),
+    ).fetchall()
+    return [{"instrument": i, "count": n} for i, n in rows]
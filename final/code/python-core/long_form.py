@@ -0,0 +1,81 @@
+from functools import lru_cache
+import numpy as np
+from music_generator import generate_dummy_wav_bytes
+from pcm_io import read_wav_bytes, to_float32, to_int16, wav_header
+from audio_effects import EffectsChain, Fade, build_chain
+
+SEGMENT_BARS = 4
+BEATS_PER_BAR = 4
+CROSSFADE_SECONDS = 0.05
+DEFAULT_FADES = {"fade_in": 0.5, "fade_out": 3.0}
+# Index into the variations from render_segments(): A A B A A A C A
+VARIATION_PATTERN = (0, 0, 1, 0, 0, 0, 2, 0)
+
+
+# A long-form request uses three entries, so this holds eight specs (~17 MB)
+@lru_cache(maxsize=24)
+def _render_segment(mood, energy, bpm, sr):
+    """
+    SEGMENT_BARS bars plus a crossfade-length tail past the last bar line,
+    kept as a read-only int16 view of the WAV bytes (half the size of float32).
+    """
+    frames = round(SEGMENT_BARS * BEATS_PER_BAR * 60.0 / bpm * sr) + int(CROSSFADE_SECONDS * sr)
+    samples, _ = read_wav_bytes(
+        generate_dummy_wav_bytes("", (frames + 0.5) / sr, sr=sr, mood=mood, energy=energy)
+    )
+    return samples[:frames]
+
+
+def render_segments(mood, energy, bpm, sr=32000):
+    """
+    Render (or fetch from cache) the bar-aligned base loop and its two
+    variations. These are the only synthesis a long-form track needs.
+    """
+    return (
+        _render_segment(mood, energy, bpm, sr),
+        _render_segment(mood, min(10, energy + 1), bpm, sr),
+        _render_segment(mood, max(1, energy - 1), bpm, sr),
+    )
+
+
+def stream_length(duration, sr=32000):
+    return 44 + int(duration * sr) * 2
+
+
+def stream_wav(segments, duration, sr=32000, effects=None):
+    """
+    Yield a mono 16-bit WAV of exactly `duration` seconds, one segment at a
+    time. Each segment contributes exactly SEGMENT_BARS bars and its tail
+    past the bar line is crossfaded into the next, so the bar grid does not
+    drift. Only one segment-sized buffer is live at once. `effects`
+    (parse_effects() options) run over the stream, with loudness measured
+    on the base loop; fades default to DEFAULT_FADES.
+    """
+    total = int(duration * sr)
+    fade = int(CROSSFADE_SECONDS * sr)
+    ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+    options = dict(DEFAULT_FADES, **(effects or {}))
+    if effects:
+        chain = build_chain(sr, to_float32(segments[0]), options, total_frames=total)
+    else:
+        chain = EffectsChain([Fade(sr, total, **options)])
+
+    yield wav_header(total, sr)
+
+    emitted = 0
+    carry = None
+    i = 0
+    while emitted < total:
+        segment = segments[VARIATION_PATTERN[i % len(VARIATION_PATTERN)]]
+        block = to_float32(segment[:len(segment) - fade])
+        if carry is not None:
+            head = block[:fade]
+            head *= ramp
+            head += carry * (1 - ramp)
+        carry = to_float32(segment[len(segment) - fade:])
+
+        block = block[:total - emitted]
+        chain.process_block(block)
+        yield to_int16(block).tobytes()
+        emitted += len(block)
+        i += 1
@@ -0,0 +1,99 @@
+import re
+import zlib
+import numpy as np
+# Sets OMP/MKL thread env before any backend imports torch
+from torch_runtime import configure_torch, run_inference
+from config import Config
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HFSentimentBackend:
+    def __init__(self):
+        from transformers import pipeline
+
+        run_inference(configure_torch)
+        self.model = pipeline(
+            "sentiment-analysis",
+            model=Config.SENTIMENT_MODEL,
+            device=-1
+        )
+        self.tokenizer = self.model.tokenizer
+
+    def predict(self, text: str) -> dict:
+        return self.model(text)[0]
+
+
+class HFEmbeddingBackend:
+    def __init__(self):
+        from sentence_transformers import SentenceTransformer
+
+        run_inference(configure_torch)
+        self.model = SentenceTransformer(Config.EMBEDDING_MODEL)
+
+    def encode(self, texts):
+        return self.model.encode(list(texts), normalize_embeddings=True)
+
+
+class LexiconSentimentBackend:
+    """Word-list sentiment with the same labels as the HF model."""
+
+    POSITIVE = frozenset([
+        "happy", "joy", "joyful", "love", "lovely", "bright", "upbeat", "fun", "great",
+        "good", "beautiful", "warm", "sunny", "excited", "cheerful", "uplifting",
+        "romantic", "peaceful", "party", "dance", "hope", "hopeful", "sweet", "relaxed",
+    ])
+    NEGATIVE = frozenset([
+        "sad", "dark", "angry", "lonely", "cry", "crying", "grief", "pain", "lost",
+        "fear", "scary", "tired", "broken", "gloomy", "melancholy", "depressing",
+        "hate", "bad", "cold", "rain", "tragic", "haunting", "sorrow",
+    ])
+    tokenizer = None
+
+    def predict(self, text: str) -> dict:
+        tokens = _TOKEN.findall(text.lower())
+        pos = sum(token in self.POSITIVE for token in tokens)
+        neg = sum(token in self.NEGATIVE for token in tokens)
+        if pos == neg:
+            return {"label": "neutral", "score": 0.5}
+        label = "positive" if pos > neg else "negative"
+        return {"label": label, "score": 0.5 + 0.5 * abs(pos - neg) / (pos + neg)}
+
+
+class HashedEmbeddingBackend:
+    """
+    Deterministic bag-of-words embedding: each word and word bigram is
+    hashed (crc32, stable across processes) into a signed bucket, then the
+    vector is L2-normalized like the MiniLM output.
+    """
+
+    def __init__(self, dim=None):
+        self.dim = dim or Config.EMBEDDING_DIM
+
+    def _encode_one(self, text: str):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        tokens = _TOKEN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts):
+        return np.stack([self._encode_one(text) for text in texts])
+
+
+BACKENDS = {
+    "hf": (HFSentimentBackend, HFEmbeddingBackend),
+    "stub": (LexiconSentimentBackend, HashedEmbeddingBackend),
+}
+
+
+def load_backends(name=None):
+    """Return (sentiment, embedding) backends for `name` (default Config.MODEL_BACKEND)."""
+    name = name or Config.MODEL_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{name}', expected one of {sorted(BACKENDS)}")
+    sentiment_cls, embedding_cls = BACKENDS[name]
+    return sentiment_cls(), embedding_cls()
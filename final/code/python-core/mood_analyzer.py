@@ -1,19 +1,20 @@
 import numpy as np
 from functools import lru_cache
-from transformers import pipeline
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+from torch_runtime import run_inference
+from model_backends import load_backends
 from config import Config
+from prompt_normalizer import PromptNormalizer, words as prompt_words
+from request_profiler import stage
 
 
 class MoodAnalyzer:
-    def __init__(self):
-        self.sentiment_model = pipeline(
-            "sentiment-analysis",
-            model=Config.SENTIMENT_MODEL,
-            device=-1
+    def __init__(self, backend=None):
+        # "hf" loads the Hugging Face models, "stub" the offline lexicon/hash pair
+        self.sentiment_backend, self.embedding_backend = load_backends(backend)
+        self.normalize = PromptNormalizer(
+            self.sentiment_backend.tokenizer,
+            max_length=Config.MAX_LENGTH
         )
-        self.embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL)
         self.moods = np.array([
             "happy",
             "sad",
@@ -22,9 +23,7 @@ class MoodAnalyzer:
             "mysterious",
             "romantic"
         ])
-        self.mood_embeddings = self.embedding_model.encode(
-            self.moods, normalize_embeddings=True
-        )
+        self.mood_embeddings = self.embedding_backend.encode(self.moods)
         self.high_energy_words = np.array([
             "excited",
             "workout",
@@ -46,22 +45,17 @@ class MoodAnalyzer:
 
     @lru_cache(maxsize=5000)
     def _embed_text(self, text: str):
-        return self.embedding_model.encode(
-            [text],
-            normalize_embeddings=True
-        )
+        return run_inference(self.embedding_backend.encode, [text])
 
     @lru_cache(maxsize=5000)
     def _sentiment_text(self, text: str):
-        result = self.sentiment_model(text)[0]
+        result = run_inference(self.sentiment_backend.predict, text)
         return result["label"].lower(), round(result["score"], 2)
 
     def _classify_mood(self, text: str):
         embedding = self._embed_text(text)
-        sims = cosine_similarity(
-            embedding,
-            self.mood_embeddings
-        )[0]
+        # Both sides are L2-normalized, so the dot product is the cosine
+        sims = (embedding @ self.mood_embeddings.T)[0]
         return self.moods[sims.argmax()]
 
     def _calculate_energy(self, words: set, sentiment: str) -> int:
@@ -72,11 +66,19 @@ class MoodAnalyzer:
         total = base + (2 * high) - (2 * low) + adjust
         return int(np.clip(total, 1, 10))
 
+    def embed(self, text: str):
+        """Normalized float32 embedding, shared with mood classification's cache."""
+        return self._embed_text(self.normalize(text))[0].astype(np.float32)
+
     def _analyze_single(self, text: str):
-        text = text.lower().strip()
-        sentiment, score = self._sentiment_text(text)
-        mood = self._classify_mood(text)
-        words = set(text.split())
+        # Every cache below is keyed on the canonical, truncated prompt
+        with stage("normalize"):
+            text = self.normalize(text)
+        with stage("sentiment"):
+            sentiment, score = self._sentiment_text(text)
+        with stage("embed"):
+            mood = self._classify_mood(text)
+        words = prompt_words(text)
         energy = self._calculate_energy(words, sentiment)
         return {
             "sentiment": sentiment,
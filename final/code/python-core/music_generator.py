@@ -2,6 +2,8 @@
 import io
 import wave
 import numpy as np
+from audio_effects import build_chain
+from request_profiler import stage
 
 
 def generate_dummy_wav_bytes(
@@ -10,6 +12,7 @@ def generate_dummy_wav_bytes(
     sr: int = 32000,
     mood: str = "calm",
     energy: int = 5,
+    effects=None,
 ):
     mood_freq_map = {
         "happy": 440,
@@ -23,24 +26,32 @@ def generate_dummy_wav_bytes(
     base_freq = mood_freq_map.get(mood, 220)
     base_freq += (energy - 5) * 15
 
-    t = np.linspace(0, duration, int(sr * duration), endpoint=False)
+    with stage("synth"):
+        t = np.linspace(0, duration, int(sr * duration), endpoint=False)
 
-    audio = 0.35 * np.sin(2 * np.pi * base_freq * t)
+        audio = 0.35 * np.sin(2 * np.pi * base_freq * t)
 
-    if energy > 6:
-        audio += 0.2 * np.sin(2 * np.pi * base_freq * 2 * t)
-    else:
-        audio += 0.1 * np.sin(2 * np.pi * base_freq * 0.5 * t)
+        if energy > 6:
+            audio += 0.2 * np.sin(2 * np.pi * base_freq * 2 * t)
+        else:
+            audio += 0.1 * np.sin(2 * np.pi * base_freq * 0.5 * t)
 
-    audio = audio / (np.max(np.abs(audio)) + 1e-9)
-    audio_int16 = (audio * 32767).astype("int16")
+        audio = audio / (np.max(np.abs(audio)) + 1e-9)
 
-    buf = io.BytesIO()
-    with wave.open(buf, "wb") as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)
-        wf.setframerate(sr)
-        wf.writeframes(audio_int16.tobytes())
+    if effects:
+        with stage("effects"):
+            audio = audio.astype(np.float32)
+            build_chain(sr, audio, effects).run(audio)
+
+    with stage("wav_write"):
+        audio_int16 = (audio * 32767).astype("int16")
+
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(sr)
+            wf.writeframes(audio_int16.tobytes())
 
     return buf.getvalue()
 
@@ -52,6 +63,7 @@ def query_musicgen(
     energy=5,
     use_colab=True,
     colab_url=None,
+    effects=None,
 ):
     # HF Space is UI-only; generate locally using AI-conditioned parameters
     return generate_dummy_wav_bytes(
@@ -59,4 +71,5 @@ def query_musicgen(
         duration,
         mood=mood,
         energy=energy,
+        effects=effects,
     )
@@ -0,0 +1,162 @@
+import io
+import os
+import mmap
+import wave
+import struct
+import subprocess
+import numpy as np
+from config import Config
+
+_INT_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def is_wav(data) -> bool:
+    return len(data) >= 12 and bytes(data[:4]) == b"RIFF" and bytes(data[8:12]) == b"WAVE"
+
+
+def _parse_wav(buf):
+    """Return (channels, sr, dtype, data_offset, data_length) for a RIFF/WAVE buffer."""
+    if not is_wav(buf):
+        raise ValueError("Not a RIFF/WAVE buffer")
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(buf):
+        chunk_id = bytes(buf[pos:pos + 4])
+        size = struct.unpack_from("<I", buf, pos + 4)[0]
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            available = min(size, len(buf) - body)
+            if available < 16:
+                raise ValueError("Truncated WAV fmt chunk")
+            tag, channels, sr = struct.unpack_from("<HHI", buf, body)
+            bits = struct.unpack_from("<H", buf, body + 14)[0]
+            if tag == _WAVE_FORMAT_EXTENSIBLE and available >= 26:
+                tag = struct.unpack_from("<H", buf, body + 24)[0]
+            fmt = (tag, channels, sr, bits // 8)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data chunk before fmt chunk")
+            tag, channels, sr, width = fmt
+            if tag == _WAVE_FORMAT_FLOAT and width == 4:
+                dtype = np.float32
+            elif tag == _WAVE_FORMAT_PCM and width in _INT_DTYPES:
+                dtype = _INT_DTYPES[width]
+            else:
+                raise ValueError(f"Unsupported WAV encoding (format {tag}, {width * 8}-bit)")
+            # Streaming writers leave 0/0xFFFFFFFF here; trust the buffer instead
+            length = min(size, len(buf) - body)
+            length -= length % (width * channels)
+            return channels, sr, dtype, body, length
+        pos = body + size + (size & 1)
+    raise ValueError("WAV has no data chunk")
+
+
+def read_wav_bytes(data):
+    """
+    Decode WAV bytes into a zero-copy numpy view: shape (frames,) for mono,
+    (frames, channels) otherwise. The view keeps `data` alive.
+    """
+    channels, sr, dtype, offset, length = _parse_wav(data)
+    count = length // np.dtype(dtype).itemsize
+    samples = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+    if channels > 1:
+        samples = samples.reshape(-1, channels)
+    return samples, sr
+
+
+def read_wav_file(path, use_mmap=None):
+    """
+    Read a WAV file. Files above Config.WAV_MMAP_THRESHOLD are mapped
+    rather than read, so only the pages actually touched are loaded.
+    """
+    if use_mmap is None:
+        use_mmap = os.path.getsize(path) >= Config.WAV_MMAP_THRESHOLD
+    with open(path, "rb") as f:
+        if use_mmap:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data = f.read()
+    return read_wav_bytes(data)
+
+
+def to_float32(samples):
+    if samples.dtype == np.float32:
+        return samples
+    if samples.dtype == np.uint8:
+        return (samples.astype(np.float32) - 128.0) / 128.0
+    scale = np.float32(1.0 / (np.iinfo(samples.dtype).max + 1))
+    return samples.astype(np.float32) * scale
+
+
+def to_int16(samples):
+    if samples.dtype == np.int16:
+        return samples
+    if samples.dtype.kind == "f":
+        return (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    return to_int16(to_float32(samples))
+
+
+def write_wav(dest, samples, sr, pad_frames=0):
+    """
+    Write 16-bit PCM to a path or binary file object, optionally followed
+    by `pad_frames` of silence (written without concatenating buffers).
+    """
+    pcm = np.ascontiguousarray(to_int16(samples))
+    channels = 1 if pcm.ndim == 1 else pcm.shape[1]
+    with wave.open(dest, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(sr)
+        wf.writeframes(memoryview(pcm).cast("B"))
+        if pad_frames > 0:
+            wf.writeframes(bytes(pad_frames * channels * 2))
+
+
+def wav_header(frames, sr, channels=1):
+    """44-byte 16-bit PCM header for a stream whose length is known up front."""
+    data_size = frames * channels * 2
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, _WAVE_FORMAT_PCM, channels, sr, sr * channels * 2, channels * 2, 16,
+        b"data", data_size,
+    )
+
+
+def wav_bytes(samples, sr):
+    buf = io.BytesIO()
+    write_wav(buf, samples, sr)
+    return buf.getvalue()
+
+
+def _ffmpeg(args, input_bytes=None):
+    result = subprocess.run(
+        ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y"] + args,
+        input=input_bytes,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def load_audio(data):
+    """Decode audio bytes; ffmpeg is only spawned for non-PCM inputs."""
+    if is_wav(data):
+        try:
+            return read_wav_bytes(data)
+        except ValueError:
+            pass
+    wav = _ffmpeg(["-i", "pipe:0", "-f", "wav", "-acodec", "pcm_s16le", "pipe:1"], data)
+    return read_wav_bytes(wav)
+
+
+def encode_file(wav_path, out_path, bitrate="192k"):
+    """Encode a WAV file to a compressed format chosen by `out_path`'s extension."""
+    _ffmpeg(["-i", wav_path, "-b:a", bitrate, out_path])
+    return out_path
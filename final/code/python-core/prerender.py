@@ -0,0 +1,80 @@
+import os
+import time
+import sqlite3
+import threading
+from config import Config
+
+
+class PreRenderer(threading.Thread):
+    """
+    Background thread that renders the most requested
+    (mood, energy, duration) combinations into the render cache while the
+    service is idle. It backs off whenever a live render is active or
+    queued, or the host load is above Config.PRERENDER_MAX_LOAD per CPU.
+    Long-form requests are streamed from segments, never from the cache, so
+    durations above Config.MAX_DURATION_SECONDS are skipped.
+    """
+
+    def __init__(self, db_path, cache, admission, render, top_n=None, interval=None):
+        super().__init__(name="prerender", daemon=True)
+        self.db_path = db_path
+        self.cache = cache
+        self.admission = admission
+        self.render = render
+        self.top_n = top_n or Config.PRERENDER_TOP_N
+        self.interval = interval or Config.PRERENDER_INTERVAL_SECONDS
+        self.rendered = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def popular_specs(self):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute(
+            """
+            SELECT mood, energy, duration, COUNT(*) AS hits
+            FROM music_history
+            WHERE energy IS NOT NULL AND created_at >= datetime('now', ?)
+              AND duration <= ?
+            GROUP BY mood, energy, duration
+            ORDER BY hits DESC
+            LIMIT ?
+            """,
+            (f"-{Config.PRERENDER_WINDOW_DAYS} days", Config.MAX_DURATION_SECONDS, self.top_n),
+        ).fetchall()
+        conn.close()
+        return [(mood, energy, duration) for mood, energy, duration, _ in rows]
+
+    def idle(self) -> bool:
+        counters = self.admission.counters
+        if counters["active"] or counters["waiting"]:
+            return False
+        if hasattr(os, "getloadavg"):
+            cpus = self.admission.max_concurrent
+            return os.getloadavg()[0] / cpus < Config.PRERENDER_MAX_LOAD
+        return True
+
+    def run_once(self):
+        for mood, energy, duration in self.popular_specs():
+            if self._stop_event.is_set() or not self.idle():
+                return
+            key = self.cache.key(mood, energy, duration)
+            if key in self.cache:
+                continue
+            self.cache.put(key, self.render(mood, energy, duration))
+            self.rendered += 1
+            # Give queued live requests a chance to claim the CPU
+            time.sleep(0.05)
+
+    def run(self):
+        try:
+            # Linux threads are schedulable tasks: nice this one only
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except sqlite3.Error as e:
+                print("Pre-render pass failed:", e)
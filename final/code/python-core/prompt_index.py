@@ -0,0 +1,82 @@
+import os
+import threading
+import numpy as np
+
+
+class PromptIndex:
+    """
+    Append-only cosine index of prompt embeddings.
+
+    Vectors live in `<dir>/vectors.f32` as a row-major float32 matrix of
+    L2-normalized rows, and the matching music_history ids in
+    `<dir>/ids.i64`. Both files are only ever appended to, and searches
+    read them through np.memmap, so the matrix is never copied into the
+    Python heap.
+    """
+
+    def __init__(self, index_dir: str, dim: int = 384):
+        self.dim = dim
+        self.vectors_path = os.path.join(index_dir, "vectors.f32")
+        self.ids_path = os.path.join(index_dir, "ids.i64")
+        os.makedirs(index_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._count = self._stored_count()
+        self._vectors = None
+        self._ids = None
+
+    def _stored_count(self) -> int:
+        if not (os.path.exists(self.ids_path) and os.path.exists(self.vectors_path)):
+            return 0
+        rows = os.path.getsize(self.ids_path) // 8
+        vec_rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+        # A crash between the two appends leaves one file a row ahead
+        return min(rows, vec_rows)
+
+    def __len__(self):
+        return self._count
+
+    def ids(self) -> set:
+        """History row ids that are already indexed."""
+        with self._lock:
+            self._refresh()
+            return set(self._ids.tolist())
+
+    def add(self, row_id: int, vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        with self._lock:
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(self._count * 4 * self.dim)
+                f.write(vector.astype(np.float32).tobytes())
+            with open(self.ids_path, "ab") as f:
+                f.truncate(self._count * 8)
+                f.write(np.int64(row_id).tobytes())
+            self._count += 1
+
+    def _refresh(self):
+        if self._count == 0:
+            self._vectors = np.empty((0, self.dim), dtype=np.float32)
+            self._ids = np.empty(0, dtype=np.int64)
+        elif self._vectors is None or len(self._vectors) != self._count:
+            self._vectors = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(self._count, self.dim)
+            )
+            self._ids = np.memmap(self.ids_path, dtype=np.int64, mode="r", shape=(self._count,))
+
+    def search(self, vector, k: int = 5):
+        """Return [(row_id, score), ...] for the k most similar stored prompts."""
+        query = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        query = query / (np.linalg.norm(query) + 1e-9)
+        with self._lock:
+            self._refresh()
+            vectors, ids = self._vectors, self._ids
+        if len(ids) == 0:
+            return []
+
+        scores = vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
@@ -0,0 +1,72 @@
+import re
+import hashlib
+import unicodedata
+from functools import lru_cache
+
+# Typographic variants folded to their ASCII form before anything else
+_CHAR_MAP = str.maketrans({
+    "‘": "'", "’": "'", "‚": "'", "‛": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"',
+    "–": "-", "—": "-", "−": "-",
+    "…": "...",
+})
+_WHITESPACE = re.compile(r"\s+")
+_REPEATED_PUNCT = re.compile(r"([^\w\s])\1+")
+_SPACE_BEFORE_PUNCT = re.compile(r"\s+([,.;:!?])")
+_EDGE_PUNCT = re.compile(r"^[\s.,;:!?-]+|[\s.,;:!?-]+$")
+_WORDS = re.compile(r"\w+")
+
+
+def canonicalize(text: str) -> str:
+    """
+    NFKC-normalize, casefold, fold typographic punctuation, collapse runs
+    of whitespace and repeated punctuation, and trim punctuation at the
+    edges. "  Calm,  RELAXING music!!! " -> "calm, relaxing music".
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold().translate(_CHAR_MAP)
+    text = _REPEATED_PUNCT.sub(r"\1", text)
+    text = _WHITESPACE.sub(" ", text)
+    text = _SPACE_BEFORE_PUNCT.sub(r"\1", text)
+    return _EDGE_PUNCT.sub("", text)
+
+
+def words(text: str) -> set:
+    return set(_WORDS.findall(text))
+
+
+def prompt_hash(canonical: str) -> str:
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class PromptNormalizer:
+    """
+    Canonicalizes prompts and truncates them to `max_length` model tokens,
+    cutting the original text at a token boundary so the model never sees
+    (or spends time on) input it would discard anyway.
+    """
+
+    def __init__(self, tokenizer=None, max_length=128):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+
+    def _truncate(self, text: str) -> str:
+        if self.tokenizer is None:
+            tokens = text.split(" ")
+            return " ".join(tokens[:self.max_length])
+        # Leave room for the special tokens the model adds
+        budget = self.max_length - 2
+        # No token is longer than this many characters in practice; bounds tokenizer work
+        text = text[:self.max_length * 16]
+        encoding = self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+        )
+        offsets = encoding["offset_mapping"]
+        if len(offsets) <= budget:
+            return text
+        return text[:offsets[budget - 1][1]].rstrip()
+
+    @lru_cache(maxsize=10000)
+    def __call__(self, text: str) -> str:
+        return self._truncate(canonicalize(text))
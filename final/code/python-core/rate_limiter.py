@@ -0,0 +1,173 @@
+import math
+import time
+import threading
+from contextlib import ExitStack, contextmanager
+from config import Config
+from torch_runtime import available_cpus
+
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets; `acquire` returns 0 when allowed, else seconds to
+    wait. A cost above the burst is admitted from a full bucket and charged
+    in full, leaving the bucket in debt until it refills.
+    """
+
+    def __init__(self, rate_per_minute, burst, max_keys=100000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, cost=1) -> float:
+        return acquire_all([(self, key)], cost)
+
+    def _tokens(self, key, now):
+        tokens, last = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - last) * self.rate)
+
+    def _wait(self, key, cost, now) -> float:
+        needed = min(cost, self.burst)
+        tokens = self._tokens(key, now)
+        return 0.0 if tokens >= needed else (needed - tokens) / self.rate
+
+    def _store(self, key, tokens, now):
+        if key not in self._buckets and len(self._buckets) >= self.max_keys:
+            # Drop buckets that have refilled completely; they carry no state
+            full = [
+                k for k, (level, last) in self._buckets.items()
+                if level + (now - last) * self.rate >= self.burst
+            ]
+            for k in full:
+                del self._buckets[k]
+        self._buckets[key] = (tokens, now)
+
+
+def acquire_all(charges, cost=1) -> float:
+    """
+    Charge `cost` to every (limiter, key) pair only if all of them allow it;
+    otherwise charge none and return the longest wait. Callers must list
+    limiters in a fixed order, since their locks are taken in list order.
+    """
+    now = time.monotonic()
+    with ExitStack() as stack:
+        for limiter, _ in charges:
+            stack.enter_context(limiter._lock)
+        wait = max(limiter._wait(key, cost, now) for limiter, key in charges)
+        if wait:
+            return wait
+        for limiter, key in charges:
+            limiter._store(key, limiter._tokens(key, now) - cost, now)
+    return 0.0
+
+
+class RenderAdmission:
+    """
+    Caps concurrent renders and sheds load when the expected queue wait
+    (from a moving average of render time) exceeds the latency budget.
+    """
+
+    def __init__(self, max_concurrent=None, budget_seconds=None):
+        self.max_concurrent = (
+            max_concurrent or Config.MAX_CONCURRENT_RENDERS or available_cpus()
+        )
+        self.budget = budget_seconds or Config.RENDER_QUEUE_BUDGET_SECONDS
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        # Only one multi-slot caller gathers permits at a time, so two batches
+        # can never each hold part of what the other is waiting for
+        self._gather_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.avg_render_seconds = 1.0
+        self.counters = {
+            "active": 0,
+            "waiting": 0,
+            "admitted": 0,
+            "completed": 0,
+            "shed": 0,
+            "rate_limited": 0,
+        }
+
+    def expected_wait(self, slots=1) -> float:
+        queued = self.counters["active"] + self.counters["waiting"] - self.max_concurrent + slots
+        return max(0, queued) / self.max_concurrent * self.avg_render_seconds
+
+    def _acquire(self, slots) -> bool:
+        """Take `slots` permits within the budget, all or none."""
+        if slots == 1:
+            return self._slots.acquire(timeout=self.budget)
+        deadline = time.monotonic() + self.budget
+        if not self._gather_lock.acquire(timeout=self.budget):
+            return False
+        taken = 0
+        try:
+            while taken < slots and self._slots.acquire(
+                timeout=max(0, deadline - time.monotonic())
+            ):
+                taken += 1
+        finally:
+            self._gather_lock.release()
+        if taken < slots:
+            for _ in range(taken):
+                self._slots.release()
+            return False
+        return True
+
+    def reject(self, counter="rate_limited"):
+        with self._lock:
+            self.counters[counter] += 1
+
+    @contextmanager
+    def slot(self, slots=1, items=1):
+        """
+        Yield None once `slots` render slots (capped at max_concurrent) are
+        held, or the Retry-After seconds if shed. The hold time is averaged
+        per render as slot-seconds over `items`, so a batch counts as the
+        renders it did rather than one long render.
+        """
+        slots = max(1, min(slots, self.max_concurrent))
+        with self._lock:
+            wait = self.expected_wait(slots)
+            if wait > self.budget:
+                self.counters["shed"] += 1
+                shed = True
+            else:
+                self.counters["waiting"] += slots
+                shed = False
+        if shed:
+            yield max(1, math.ceil(wait))
+            return
+
+        acquired = self._acquire(slots)
+        with self._lock:
+            self.counters["waiting"] -= slots
+            if acquired:
+                self.counters["active"] += slots
+                self.counters["admitted"] += 1
+            else:
+                self.counters["shed"] += 1
+        if not acquired:
+            yield max(1, math.ceil(self.avg_render_seconds))
+            return
+
+        start = time.monotonic()
+        try:
+            yield None
+        finally:
+            elapsed = time.monotonic() - start
+            for _ in range(slots):
+                self._slots.release()
+            with self._lock:
+                self.counters["active"] -= slots
+                self.counters["completed"] += 1
+                per_render = elapsed * slots / max(1, items)
+                self.avg_render_seconds = 0.8 * self.avg_render_seconds + 0.2 * per_render
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self.counters,
+                max_concurrent=self.max_concurrent,
+                avg_render_seconds=round(self.avg_render_seconds, 3),
+                expected_wait_seconds=round(self.expected_wait(), 3),
+            )
@@ -0,0 +1,115 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from config import Config
+
+
+class RenderCache:
+    """
+    On-disk LRU cache of rendered audio, keyed by the render inputs.
+    Rendering only depends on (mood, energy, duration, format, effects),
+    so every request with the same inputs can be served from one file.
+    Config.RENDER_VERSION is hashed in too, so a change to the synthesis
+    or effects code never serves audio rendered by the old code.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+        # Survive restarts: oldest files first so they are evicted first
+        files = []
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.endswith(".tmp") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._size += size
+
+    @staticmethod
+    def key(mood, energy, duration, fmt="wav", effects=None) -> str:
+        spec = json.dumps(
+            [Config.RENDER_VERSION, mood, int(energy), int(duration), fmt, effects or {}],
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha1(spec.encode("utf-8")).hexdigest() + "." + fmt
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """Return the file path for `key`, or None on a miss."""
+        with self._lock:
+            if key in self._entries and os.path.exists(self.path(key)):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self.path(key)
+            self._size -= self._entries.pop(key, 0)
+            self.misses += 1
+            return None
+
+    def open(self, key):
+        """Return an open binary file for `key`, or None on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            f = open(self.path(key), "rb")
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return f
+
+    def put(self, key: str, data: bytes) -> str:
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path(key))
+
+        evicted = []
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._size += len(data)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._size -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self.path(old_key))
+            except FileNotFoundError:
+                pass
+        return self.path(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,144 @@
+import os
+import sys
+import hmac
+import time
+import uuid
+import random
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from config import Config
+
+_local = threading.local()
+_NULL_STAGE = nullcontext()
+_profiles = deque(maxlen=Config.PROFILE_KEEP)
+_profiles_lock = threading.Lock()
+
+
+class RequestProfile:
+    """
+    Stack samples for one request. A sampler thread snapshots the request
+    thread and the inference pool threads (where tokenization and the model
+    forward pass run) every Config.PROFILE_INTERVAL_MS, and prefixes each
+    folded stack with the stage that was active, e.g.
+    "stage:analyze;stage:sentiment;predict (model_backends.py:27);...".
+    Other requests sharing the inference pool can show up in its samples.
+    """
+
+    def __init__(self, method, path):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.duration_ms = None
+        self.stages = Counter()
+        self.samples = Counter()
+        self._stage_stack = []
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._start = time.perf_counter()
+
+    def start(self):
+        self._sampler.start()
+
+    def finish(self):
+        self._stop.set()
+        self._sampler.join()
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 2)
+        with _profiles_lock:
+            _profiles.append(self)
+
+    @contextmanager
+    def stage(self, name):
+        self._stage_stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[">".join(self._stage_stack)] += (time.perf_counter() - start) * 1000
+            self._stage_stack.pop()
+
+    def _sample(self):
+        interval = Config.PROFILE_INTERVAL_MS / 1000.0
+        own = threading.get_ident()
+        while not self._stop.wait(interval):
+            prefix = ";".join(f"stage:{s}" for s in self._stage_stack) or "stage:request"
+            inference_ids = {
+                t.ident for t in threading.enumerate() if t.name.startswith("inference")
+            }
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if thread_id != self._thread_id and thread_id not in inference_ids:
+                    continue
+                if thread_id in inference_ids and frame.f_code.co_name == "_worker":
+                    # Idle pool thread blocked on its work queue
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+                    )
+                    frame = frame.f_back
+                thread_tag = "request" if thread_id == self._thread_id else "inference"
+                self.samples[";".join([prefix, thread_tag] + stack[::-1])] += 1
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "samples": sum(self.samples.values()),
+            "stages_ms": {name: round(ms, 2) for name, ms in self.stages.items()},
+        }
+
+    def folded(self) -> str:
+        """Collapsed stacks, one "frame;frame;... count" line each (flamegraph.pl, speedscope)."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+def should_profile(header_value) -> bool:
+    """The X-Profile header only counts when it carries the configured secret."""
+    if header_value and Config.PROFILE_SECRET:
+        return hmac.compare_digest(header_value.encode(), Config.PROFILE_SECRET.encode())
+    return Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE
+
+
+def begin(method, path):
+    profile = RequestProfile(method, path)
+    _local.profile = profile
+    profile.start()
+    return profile
+
+
+def end():
+    profile = getattr(_local, "profile", None)
+    if profile is not None:
+        _local.profile = None
+        profile.finish()
+    return profile
+
+
+def stage(name):
+    """Tag a section of the current request; a shared no-op when not profiling."""
+    profile = getattr(_local, "profile", None)
+    if profile is None:
+        return _NULL_STAGE
+    return profile.stage(name)
+
+
+def recent():
+    with _profiles_lock:
+        return list(_profiles)
+
+
+def get(profile_id):
+    with _profiles_lock:
+        for profile in _profiles:
+            if profile.id == profile_id:
+                return profile
+    return None
@@ -1,18 +1,46 @@
-from flask import Flask, request, send_file, jsonify
+from flask import Flask, Response, request, send_file, jsonify, g
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
+import re
+import json
+import hmac
 import sqlite3
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 from music_generator import query_musicgen
+from music_parameters import map_to_music
+from long_form import render_segments, stream_wav, stream_length
 from mood_analyzer import MoodAnalyzer
+from auth import create_user, authenticate, SessionCache
+from config import Config
+from rate_limiter import TokenBucketLimiter, RenderAdmission, acquire_all
+from prompt_index import PromptIndex
+from render_cache import RenderCache
+from prerender import PreRenderer
+from batch import parse_spec, stream_zip
+from audio_effects import parse_effects
+from prompt_normalizer import prompt_hash
+import request_profiler
+from request_profiler import stage
+from history_analytics import (
+    init_analytics_tables,
+    record_history,
+    user_stats,
+    user_daily,
+    daily_moods,
+    popular_instruments,
+)
 
 app = Flask(__name__)
+if Config.TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.TRUSTED_PROXY_HOPS)
 
 CORS(
     app,
     resources={r"/*": {"origins": "*"}},
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", "Range", "X-Profile"],
+    expose_headers=["Content-Location", "Content-Range", "Accept-Ranges", "ETag", "X-Profile-Id"],
     methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
 )
 
@@ -21,6 +49,12 @@ os.makedirs(DATA_DIR, exist_ok=True)
 
 USERS_DB_PATH = os.path.join(DATA_DIR, "users.db")
 MUSIC_DB_PATH = os.path.join(DATA_DIR, "music_history.db")
+# Embedding spaces differ between backends, so each keeps its own index
+PROMPT_INDEX_DIR = os.path.join(
+    DATA_DIR,
+    "prompt_index" if Config.MODEL_BACKEND == "hf" else f"prompt_index_{Config.MODEL_BACKEND}",
+)
+RENDER_CACHE_DIR = os.path.join(DATA_DIR, "render_cache")
 
 
 def init_users_db():
@@ -54,11 +88,19 @@ def init_music_db():
             instruments TEXT,
             tempo INTEGER,
             duration INTEGER,
+            energy INTEGER,
+            prompt_hash TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
         """
     )
+    columns = {row[1] for row in c.execute("PRAGMA table_info(music_history)")}
+    if "energy" not in columns:
+        c.execute("ALTER TABLE music_history ADD COLUMN energy INTEGER")
+    if "prompt_hash" not in columns:
+        c.execute("ALTER TABLE music_history ADD COLUMN prompt_hash TEXT")
     conn.commit()
+    init_analytics_tables(conn)
     conn.close()
 
 
@@ -66,6 +108,155 @@ init_users_db()
 init_music_db()
 
 mood_analyzer = MoodAnalyzer()
+sessions = SessionCache()
+user_limiter = TokenBucketLimiter(Config.USER_RATE_PER_MINUTE, Config.USER_RATE_BURST)
+ip_limiter = TokenBucketLimiter(Config.IP_RATE_PER_MINUTE, Config.IP_RATE_BURST)
+admission = RenderAdmission()
+prompt_index = PromptIndex(PROMPT_INDEX_DIR, dim=Config.EMBEDDING_DIM)
+render_cache = RenderCache(RENDER_CACHE_DIR, Config.RENDER_CACHE_MAX_BYTES)
+
+
+def render_track(mood, energy, duration, effects=None):
+    # The local generator is fully determined by these inputs, not the prompt
+    return query_musicgen(
+        prompt="",
+        duration=duration,
+        mood=mood,
+        energy=energy,
+        use_colab=False,
+        effects=effects,
+    )
+
+
+def cached_render(mood, energy, duration, effects=None):
+    """Return the render cache key for these inputs, rendering on a miss."""
+    key = render_cache.key(mood, energy, duration, effects=effects)
+    if render_cache.get(key) is None:
+        with stage("render"):
+            audio_bytes = render_track(mood, energy, duration, effects)
+        with stage("cache_write"):
+            render_cache.put(key, audio_bytes)
+    return key
+
+
+prerenderer = PreRenderer(MUSIC_DB_PATH, render_cache, admission, render_track)
+if Config.PRERENDER_ENABLED:
+    prerenderer.start()
+
+
+def index_prompts(rows):
+    """
+    Add (row_id, prompt) pairs to the similarity index. A row that fails is
+    logged and picked up by backfill_prompt_index() on the next start.
+    """
+    for row_id, prompt in rows:
+        try:
+            prompt_index.add(row_id, mood_analyzer.embed(prompt or ""))
+        except Exception as e:
+            print(f"Indexing history row {row_id} failed:", e)
+
+
+def backfill_prompt_index():
+    """Index every history row missing from the index, wherever it falls in id order."""
+    indexed = prompt_index.ids()
+    conn = sqlite3.connect(MUSIC_DB_PATH)
+    rows = conn.execute("SELECT id, prompt FROM music_history ORDER BY id").fetchall()
+    conn.close()
+    index_prompts([(row_id, prompt) for row_id, prompt in rows if row_id not in indexed])
+
+
+backfill_prompt_index()
+
+
+@app.before_request
+def start_profile():
+    g.profile = None
+    if request.path.startswith("/profiles"):
+        return
+    if request_profiler.should_profile(request.headers.get("X-Profile")):
+        g.profile = request_profiler.begin(request.method, request.path)
+
+
+@app.after_request
+def add_profile_header(response):
+    if g.get("profile") is not None:
+        response.headers["X-Profile-Id"] = g.profile.id
+    return response
+
+
+@app.teardown_request
+def finish_profile(exc):
+    request_profiler.end()
+
+
+@app.before_request
+def load_session_user():
+    g.user = None
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        g.user = sessions.get(header[7:].strip())
+
+
+def too_many_requests(retry_after):
+    response = jsonify({"error": "Too many requests, try again later"})
+    response.headers["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+    return response, 429
+
+
+def rate_limit_retry_after(cost=1):
+    """Charge the client's IP (and user, if signed in); 0 if allowed."""
+    # ProxyFix has already resolved the client address when proxies are trusted
+    charges = [(ip_limiter, request.remote_addr)]
+    if g.user:
+        charges.append((user_limiter, g.user["username"]))
+    # Neither bucket is charged unless both allow the request
+    retry_after = acquire_all(charges, cost)
+    if retry_after:
+        admission.reject()
+    return retry_after
+
+
+def int_arg(name, default, low, high):
+    """Integer query parameter clamped to [low, high]; None if it is not an integer."""
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError:
+        return None
+    return max(low, min(value, high))
+
+
+RENDER_KEY_PATTERN = re.compile(r"^[0-9a-f]{40}\.wav$")
+
+
+def send_render(key):
+    """
+    Serve a stored render from disk: werkzeug answers Range requests with
+    206 and If-None-Match with 304, and gunicorn can sendfile() full
+    responses. Content-Location gives players a GET URL to seek against.
+    """
+    response = send_file(
+        render_cache.path(key),
+        mimetype="audio/wav",
+        as_attachment=False,
+        download_name="generated_music.wav",
+        conditional=True,
+        etag=key.split(".")[0],
+        max_age=Config.RENDER_MAX_AGE_SECONDS,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.headers["Content-Location"] = f"/renders/{key}"
+    return response
+
+
+@app.route("/renders/<key>", methods=["GET"])
+def get_render(key):
+    if RENDER_KEY_PATTERN.match(key) and render_cache.get(key) is not None:
+        try:
+            return send_render(key)
+        except FileNotFoundError:
+            pass
+    return jsonify({"error": "Render not found"}), 404
 
 
 @app.route("/studio-generate", methods=["POST"])
@@ -78,55 +269,353 @@ def studio_generate():
     duration = int(data.get("duration", 12))
     tempo = int(data.get("tempo", 120))
     instruments = data.get("instruments", "piano")
-    username = data.get("username", "guest")
+    effects, error = parse_effects(data.get("effects"))
+    if error:
+        return jsonify({"error": error}), 400
 
-    if duration < 5 or duration > 30:
-        return jsonify({"error": "Duration must be between 5–30 seconds"}), 400
+    if g.user is None and Config.REQUIRE_AUTH:
+        return jsonify({"error": "Authentication required"}), 401
+    username = g.user["username"] if g.user else "guest"
 
-    analysis = mood_analyzer.analyze(prompt)
-    mood = analysis["mood"]
-    energy = analysis["energy"]
+    long_form = bool(data.get("long_form"))
+    max_duration = Config.LONG_FORM_MAX_SECONDS if long_form else Config.MAX_DURATION_SECONDS
+    if duration < 5 or duration > max_duration:
+        return jsonify({"error": f"Duration must be between 5–{max_duration} seconds"}), 400
 
-    audio_bytes = query_musicgen(
-        prompt=prompt,
-        duration=duration,
-        mood=mood,
-        energy=energy,
-        use_colab=False,
-    )
+    retry_after = rate_limit_retry_after()
+    if retry_after:
+        return too_many_requests(retry_after)
+
+    with admission.slot() as shed_retry_after:
+        if shed_retry_after:
+            return too_many_requests(shed_retry_after)
+
+        with stage("analyze"):
+            analysis = mood_analyzer.analyze(prompt)
+        mood = analysis["mood"]
+        energy = analysis["energy"]
+
+        if long_form:
+            # Segments are rendered here, inside the slot; streaming stitches them and
+            # runs any effects over the stitched blocks
+            bpm = map_to_music(mood, analysis["sentiment"], energy)["tempo"]
+            segments = render_segments(mood, energy, bpm)
+        else:
+            cache_key = cached_render(mood, energy, duration, effects)
 
     try:
-        conn = sqlite3.connect(MUSIC_DB_PATH)
-        c = conn.cursor()
-        c.execute(
-            """
-            INSERT INTO music_history
-            (username, prompt, mood, instruments, tempo, duration)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (username, prompt, mood, instruments, tempo, duration),
+        with stage("history"):
+            conn = sqlite3.connect(MUSIC_DB_PATH)
+            (row_id,) = record_history(conn, [{
+                "username": username,
+                "prompt": prompt,
+                "mood": mood,
+                "instruments": instruments,
+                "tempo": tempo,
+                "duration": duration,
+                "energy": energy,
+                "prompt_hash": prompt_hash(mood_analyzer.normalize(prompt)),
+            }])
+            conn.close()
+            index_prompts([(row_id, prompt)])
+    except Exception:
+        pass
+
+    if long_form:
+        return Response(
+            stream_wav(segments, duration, effects=effects),
+            mimetype="audio/wav",
+            headers={"Content-Length": str(stream_length(duration))},
         )
-        conn.commit()
+
+    try:
+        return send_render(cache_key)
+    except FileNotFoundError:
+        # Evicted by another request's put() since the lookup above
+        return send_render(cached_render(mood, energy, duration, effects))
+
+
+@app.route("/studio-generate-batch", methods=["POST"])
+def studio_generate_batch():
+    data = request.get_json()
+    items = data.get("items") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > Config.BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {Config.BATCH_MAX_ITEMS} items per batch"}), 400
+
+    specs = []
+    for i, item in enumerate(items):
+        spec, error = parse_spec(item)
+        if error:
+            return jsonify({"error": f"Item {i}: {error}"}), 400
+        specs.append(spec)
+
+    if g.user is None and Config.REQUIRE_AUTH:
+        return jsonify({"error": "Authentication required"}), 401
+    username = g.user["username"] if g.user else "guest"
+
+    retry_after = rate_limit_retry_after(cost=len(specs))
+    if retry_after:
+        return too_many_requests(retry_after)
+
+    # Analysis runs on the shared inference pool, not a render slot; it
+    # decides how many distinct renders (and so slots) the batch needs
+    for spec in specs:
+        spec["canonical"] = mood_analyzer.normalize(spec["prompt"])
+    prompts = list(dict.fromkeys(spec["canonical"] for spec in specs))
+    analyses = dict(zip(prompts, mood_analyzer.analyze(prompts)))
+    for spec in specs:
+        spec["mood"] = analyses[spec["canonical"]]["mood"]
+        spec["energy"] = analyses[spec["canonical"]]["energy"]
+        spec["cache_key"] = render_cache.key(
+            spec["mood"], spec["energy"], spec["duration"], effects=spec["effects"]
+        )
+
+    # Identical render specs are rendered once, cache hits not at all
+    unique = {spec["cache_key"]: spec for spec in specs}
+    missing = [spec for key, spec in unique.items() if key not in render_cache]
+    rendered = {}
+    if missing:
+        workers = min(len(missing), admission.max_concurrent)
+        # One slot per parallel render, so the batch counts against the cap
+        with admission.slot(slots=workers, items=len(missing)) as shed_retry_after:
+            if shed_retry_after:
+                return too_many_requests(shed_retry_after)
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(
+                    lambda s: render_track(s["mood"], s["energy"], s["duration"], s["effects"]),
+                    missing,
+                )
+                for spec, audio_bytes in zip(missing, results):
+                    render_cache.put(spec["cache_key"], audio_bytes)
+                    rendered[spec["cache_key"]] = audio_bytes
+
+    try:
+        conn = sqlite3.connect(MUSIC_DB_PATH)
+        row_ids = record_history(conn, [
+            {
+                "username": username,
+                "prompt": spec["prompt"],
+                "mood": spec["mood"],
+                "instruments": spec["instruments"],
+                "tempo": spec["tempo"],
+                "duration": spec["duration"],
+                "energy": spec["energy"],
+                "prompt_hash": prompt_hash(spec["canonical"]),
+            }
+            for spec in specs
+        ])
         conn.close()
+        index_prompts([(row_id, spec["prompt"]) for row_id, spec in zip(row_ids, specs)])
     except Exception:
         pass
 
-    audio_io = BytesIO(audio_bytes)
-    audio_io.seek(0)
+    manifest = []
 
-    return send_file(
-        audio_io,
-        mimetype="audio/wav",
-        as_attachment=False,
-        download_name="generated_music.wav",
+    def entries():
+        for i, spec in enumerate(specs):
+            name = f"{i + 1:02d}_{spec['mood']}.wav"
+            key = spec["cache_key"]
+            source = rendered.get(key) or render_cache.open(key)
+            if source is None:
+                # Evicted since the lookup above
+                source = render_track(spec["mood"], spec["energy"], spec["duration"], spec["effects"])
+            manifest.append({
+                "file": name,
+                "prompt": spec["prompt"],
+                "mood": spec["mood"],
+                "energy": spec["energy"],
+                "duration": spec["duration"],
+            })
+            yield name, source
+        yield "manifest.json", json.dumps(manifest, indent=2).encode("utf-8")
+
+    return Response(
+        stream_zip(entries()),
+        mimetype="application/zip",
+        headers={"Content-Disposition": "attachment; filename=generated_batch.zip"},
     )
 
 
+@app.route("/similar", methods=["GET"])
+def similar():
+    prompt = request.args.get("prompt", "").strip()
+    if not prompt:
+        return jsonify({"error": "prompt is required"}), 400
+    k = int_arg("k", 5, 1, 50)
+    if k is None:
+        return jsonify({"error": "k must be an integer"}), 400
+
+    matches = prompt_index.search(mood_analyzer.embed(prompt), k)
+    if not matches:
+        return jsonify([]), 200
+
+    scores = dict(matches)
+    conn = sqlite3.connect(MUSIC_DB_PATH)
+    rows = conn.execute(
+        f"""
+        SELECT id, username, prompt, mood, instruments, tempo, duration, created_at
+        FROM music_history WHERE id IN ({",".join("?" * len(scores))})
+        """,
+        list(scores),
+    ).fetchall()
+    conn.close()
+
+    results = [
+        {
+            "id": row[0],
+            "username": row[1],
+            "prompt": row[2],
+            "mood": row[3],
+            "instruments": row[4],
+            "tempo": row[5],
+            "duration": row[6],
+            "created_at": row[7],
+            "score": round(scores[row[0]], 4),
+        }
+        for row in rows
+    ]
+    results.sort(key=lambda r: r["score"], reverse=True)
+    return jsonify(results), 200
+
+
+@app.route("/analytics/users/<username>", methods=["GET"])
+def analytics_user(username):
+    days = int_arg("days", 30, 1, 366)
+    if days is None:
+        return jsonify({"error": "days must be an integer"}), 400
+    conn = sqlite3.connect(MUSIC_DB_PATH)
+    stats = user_stats(conn, username)
+    if stats is not None:
+        stats["daily"] = user_daily(conn, username, days)
+    conn.close()
+    if stats is None:
+        return jsonify({"error": "No history for user"}), 404
+    return jsonify(stats), 200
+
+
+@app.route("/analytics/daily", methods=["GET"])
+def analytics_daily():
+    days = int_arg("days", 30, 1, 366)
+    if days is None:
+        return jsonify({"error": "days must be an integer"}), 400
+    conn = sqlite3.connect(MUSIC_DB_PATH)
+    rows = daily_moods(conn, days)
+    conn.close()
+    return jsonify(rows), 200
+
+
+@app.route("/analytics/instruments", methods=["GET"])
+def analytics_instruments():
+    limit = int_arg("limit", 10, 1, 100)
+    if limit is None:
+        return jsonify({"error": "limit must be an integer"}), 400
+    conn = sqlite3.connect(MUSIC_DB_PATH)
+    rows = popular_instruments(conn, limit)
+    conn.close()
+    return jsonify(rows), 200
+
+
+@app.route("/signup", methods=["POST"])
+def signup():
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Invalid JSON body"}), 400
+
+    full_name = data.get("fullName", "").strip()
+    username = data.get("username", "").strip()
+    email = data.get("email", "").strip()
+    password = data.get("password", "")
+
+    if not all([full_name, username, email, password]):
+        return jsonify({"error": "All fields are mandatory"}), 400
+
+    try:
+        create_user(USERS_DB_PATH, full_name, username, email, password)
+    except sqlite3.IntegrityError:
+        return jsonify({"error": "Username or email already exists"}), 400
+
+    return jsonify({"message": "Signup successful"}), 201
+
+
+@app.route("/signin", methods=["POST"])
+def signin():
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Invalid JSON body"}), 400
+
+    username = data.get("username", "").strip()
+    password = data.get("password", "")
+
+    if not username or not password:
+        return jsonify({"error": "Username and password are required"}), 400
+
+    user = authenticate(USERS_DB_PATH, username, password)
+    if user is None:
+        return jsonify({"error": "Invalid username or password"}), 401
+
+    return jsonify({
+        "message": "Signin successful",
+        "user": user,
+        "token": sessions.issue(user),
+    }), 200
+
+
+def profiles_forbidden():
+    # Profiles expose stacks and request paths; without a secret they are not served
+    if not Config.PROFILE_SECRET:
+        return jsonify({"error": "Profiling is not enabled"}), 404
+    header = request.headers.get("X-Profile", "").encode()
+    if not hmac.compare_digest(header, Config.PROFILE_SECRET.encode()):
+        return jsonify({"error": "Forbidden"}), 403
+    return None
+
+
+@app.route("/profiles", methods=["GET"])
+def list_profiles():
+    denied = profiles_forbidden()
+    if denied:
+        return denied
+    return jsonify([p.summary() for p in reversed(request_profiler.recent())]), 200
+
+
+@app.route("/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    denied = profiles_forbidden()
+    if denied:
+        return denied
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return jsonify(dict(profile.summary(), stacks=dict(profile.samples.most_common(200)))), 200
+
+
+@app.route("/profiles/<profile_id>/folded", methods=["GET"])
+def get_profile_folded(profile_id):
+    denied = profiles_forbidden()
+    if denied:
+        return denied
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return Response(profile.folded(), mimetype="text/plain")
+
+
 @app.route("/health", methods=["GET"])
 def health():
     return jsonify({"status": "ok", "service": "AI Music Backend"}), 200
 
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify({
+        "admission": admission.stats(),
+        "render_cache": dict(render_cache.stats(), prerendered=prerenderer.rendered),
+    }), 200
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     app.run(host="0.0.0.0", port=port, debug=False)
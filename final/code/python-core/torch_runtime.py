@@ -0,0 +1,166 @@
+import os
+import sys
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+
+def _cgroup_cpu_limit():
+    """CPU quota from cgroup v2 (cpu.max) or v1 (cfs quota/period), else None."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _parse_cpu_list(spec):
+    """'0-3,6' -> {0, 1, 2, 3, 6}"""
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def available_cpus() -> int:
+    """CPUs this process may actually use: affinity mask capped by cgroup quota."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_limit()
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return cpus
+
+
+def intra_op_threads() -> int:
+    if Config.TORCH_INTRA_OP_THREADS:
+        return Config.TORCH_INTRA_OP_THREADS
+    return max(1, available_cpus() // Config.INFERENCE_WORKERS)
+
+
+# OpenMP/MKL read these when torch is first imported, so this module
+# must be imported before transformers / sentence_transformers.
+for _var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, str(intra_op_threads()))
+
+
+def _pin_inference_thread():
+    if Config.TORCH_CPU_AFFINITY and hasattr(os, "sched_setaffinity"):
+        allowed = _parse_cpu_list(Config.TORCH_CPU_AFFINITY) & os.sched_getaffinity(0)
+        if allowed:
+            # On Linux pid 0 addresses the calling thread only
+            os.sched_setaffinity(0, allowed)
+
+
+_inference_pool = ThreadPoolExecutor(
+    max_workers=Config.INFERENCE_WORKERS,
+    thread_name_prefix="inference",
+    initializer=_pin_inference_thread,
+)
+_configured = False
+
+
+def configure_torch(intra=None, inter=None):
+    """
+    Apply thread settings on the calling thread and return the intra-op
+    count torch reports. OpenMP keeps a count per thread, so this must run
+    on the thread that does inference; inter-op threads can only be set
+    once per process.
+    """
+    global _configured
+    import torch
+
+    torch.set_num_threads(intra or intra_op_threads())
+    if not _configured:
+        try:
+            torch.set_num_interop_threads(inter or Config.TORCH_INTER_OP_THREADS)
+        except RuntimeError:
+            # Parallel work already ran; torch keeps its existing pool
+            pass
+        _configured = True
+    return torch.get_num_threads()
+
+
+def run_inference(fn, *args, **kwargs):
+    """
+    Run a model call on the dedicated inference pool, so request threads
+    never run torch ops concurrently and oversubscribe the cores.
+    """
+    return _inference_pool.submit(fn, *args, **kwargs).result()
+
+
+def benchmark(samples=40, concurrency=(1, 2, 4)):
+    """
+    Sweep intra-op thread counts and request concurrency against a live
+    MoodAnalyzer and report p50/p99 latency and throughput for each.
+    """
+    from mood_analyzer import MoodAnalyzer
+
+    analyzer = MoodAnalyzer()
+    cpus = available_cpus()
+    thread_counts = sorted({1, 2, 4, cpus, max(1, cpus // 2)} & set(range(1, cpus + 1)))
+    results = []
+    counter = 0
+    for threads in thread_counts:
+        applied = run_inference(configure_torch, intra=threads)
+        for clients in concurrency:
+            texts = []
+            for _ in range(samples):
+                counter += 1
+                # Unique texts so the lru caches never answer
+                texts.append(f"calm relaxing evening music take {counter}")
+            latencies = []
+
+            def timed(text):
+                start = time.perf_counter()
+                analyzer.analyze(text)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                list(pool.map(timed, texts))
+            elapsed = time.perf_counter() - start
+            latencies.sort()
+            results.append({
+                "intra_op_threads": threads,
+                "torch_threads": applied,
+                "clients": clients,
+                "p50_ms": round(latencies[len(latencies) // 2], 1),
+                "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 1),
+                "throughput_rps": round(samples / elapsed, 1),
+            })
+    return results
+
+
+if __name__ == "__main__" and "--benchmark" in sys.argv:
+    print(f"Available CPUs: {available_cpus()} (cgroup quota: {_cgroup_cpu_limit()})")
+    results = benchmark()
+    for row in results:
+        print(row)
+    best_latency = min(results, key=lambda r: r["p99_ms"])
+    best_throughput = max(results, key=lambda r: r["throughput_rps"])
+    print("Best p99 latency:", best_latency)
+    print("Best throughput:", best_throughput)